@@ -6,14 +6,18 @@ Bypasses REST API for maximum speed
 
 import sys
 import os
-from pathlib import Path
-import subprocess
+import collections
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import csv
-import psycopg2
-from psycopg2.extras import execute_values
-import uuid
-from docx import Document
+import psycopg
+
+from readers import check_antiword, read_chunk
+from scan import scan_song_dirs
+from sinks import (INDEX_BACKUP_PATH, CopyTempTableSink, drop_song_indexes,
+                   fetch_existing_songs, recreate_song_indexes)
 
 # Configuration
 SONG_DIRS = {
@@ -26,136 +30,161 @@ SONG_DIRS = {
 DB_CONFIG = {
     'host': 'localhost',
     'port': 5432,
-    'database': 'teleprompter',
+    'dbname': 'teleprompter',
     'user': 'teleprompter_user',
     'password': 'teleprompter_pass_2024'
 }
 
-def check_antiword():
-    """Check if antiword is installed"""
-    try:
-        subprocess.run(['antiword'], capture_output=True)
-        print("✓ antiword found (for .doc files)\n")
-        return True
-    except FileNotFoundError:
-        print("✗ antiword not found. Please install: sudo apt-get install antiword")
-        return False
-
-def extract_text_from_doc(filepath):
-    """Extract text from .doc file using antiword"""
-    try:
-        result = subprocess.run(
-            ['antiword', '-w', '0', filepath],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
-        print(f"Warning: Could not read {filepath}: {e}")
-        return None
-
-def extract_text_from_docx(filepath):
-    """Extract text from .docx file using python-docx"""
-    try:
-        doc = Document(filepath)
-        text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-        return text.strip()
-    except Exception as e:
-        print(f"Warning: Could not read {filepath}: {e}")
-        return None
-
-def extract_text_from_file(filepath):
-    """Extract text from .doc or .docx file"""
-    filepath = Path(filepath)
-    if filepath.suffix.lower() == '.doc':
-        return extract_text_from_doc(str(filepath))
-    elif filepath.suffix.lower() == '.docx':
-        return extract_text_from_docx(str(filepath))
-    else:
-        return None
-
-def scan_song_files():
-    """Scan all song directories and return list of files"""
-    song_files = []
-
-    for language, directory in SONG_DIRS.items():
-        dir_path = Path(directory)
-        if not dir_path.exists():
-            print(f"Warning: Directory not found: {directory}")
-            continue
-
-        # Scan for both .doc and .docx files
-        doc_files = list(dir_path.glob('*.doc'))
-        docx_files = list(dir_path.glob('*.docx'))
-        files = doc_files + docx_files
-
-        for file in files:
-            song_files.append((str(file), language))
-
-        print(f"Found {len(files)} {language} songs ({len(doc_files)} .doc, {len(docx_files)} .docx)")
-
-    return song_files
-
 def connect_db():
-    """Connect to PostgreSQL database"""
+    """Connect to PostgreSQL database; raises on failure
+
+    Callers decide how to fail: main() exits, worker threads let the
+    exception propagate so it is reported instead of silently killing
+    the thread.
+    """
+    conn = psycopg.connect(**DB_CONFIG)
+    # Explicit: the import loop owns commit cadence
+    conn.autocommit = False
+    return conn
+
+def process_song(song, lyrics):
+    """Build the insert tuple for one song from its extracted lyrics"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        sys.exit(1)
-
-def process_song(filepath, language):
-    """Process a single song file and return data tuple for insertion"""
-    try:
-        # Extract filename without extension
-        filename = Path(filepath).stem
-        title = filename
-
-        # Extract lyrics from .doc or .docx file
-        lyrics = extract_text_from_file(filepath)
-
         if not lyrics or not lyrics.strip():
             return None, "EMPTY_CONTENT", "Empty content after extraction"
 
-        # Generate UUID
-        song_id = str(uuid.uuid4())
-
-        # Prepare data tuple (id, title, artist, lyrics, language, content, created_at, updated_at)
-        return (song_id, title, '', lyrics, language, lyrics, datetime.now(), datetime.now()), None, None
+        # Prepare data tuple (title, artist, lyrics, language, content);
+        # id and timestamps are filled server-side at insert time
+        return (song['title'], '', lyrics, song['language'], lyrics), None, None
 
     except Exception as e:
         return None, "PROCESSING_ERROR", str(e)
 
-def bulk_insert_songs(conn, songs_data):
-    """Bulk insert songs into database"""
+def _process_song_chunk(chunk):
+    """Extract a chunk of song files in one worker and build insert tuples"""
+    return [process_song(song, lyrics) for song, lyrics in zip(chunk, read_chunk(chunk))]
+
+def bulk_insert_songs(conn, sink, songs_data):
+    """Insert a batch through the sink; the caller batches commits
+
+    Returns the inserted row count, or None after a rollback — which
+    also discards any earlier uncommitted batches in the transaction,
+    so the caller must reconcile its counters.
+    """
     if not songs_data:
         return 0
 
     try:
-        cursor = conn.cursor()
+        return sink.insert(songs_data)
+    except Exception as e:
+        conn.rollback()
+        print(f"Error during bulk insert: {e}")
+        return None
 
-        insert_query = """
-        INSERT INTO songs (id, title, artist, lyrics, language, content, created_at, updated_at)
-        VALUES %s
-        ON CONFLICT (id) DO NOTHING
-        """
+def import_language(songs, executor, batch_size, totals, totals_lock,
+                    error_rows, total_files, show_progress):
+    """Run one language's extraction + insert pipeline on its own connection
 
-        execute_values(cursor, insert_query, songs_data)
-        conn.commit()
+    Languages share no rows, so each worker thread gets a private
+    connection and COPY stream; extraction still goes through the shared
+    process pool so the languages compete fairly for cores.
+    """
+    conn = connect_db()
+    with conn.cursor() as cursor:
+        cursor.execute("SET synchronous_commit = off")
+    conn.commit()
 
-        rows_inserted = cursor.rowcount
-        cursor.close()
+    sink = CopyTempTableSink(conn)
+    batch_data = []
+    batches_since_commit = 0
+    # Rows inserted but not yet committed; only added to the shared
+    # imported total once their commit goes through
+    pending = 0
 
-        return rows_inserted
+    try:
+        chunks = [songs[start:start + 50] for start in range(0, len(songs), 50)]
+
+        # Keep a bounded window of chunks in flight: executor.map would
+        # buffer every finished chunk, growing without limit whenever
+        # inserts fall behind extraction
+        def results():
+            in_flight = collections.deque()
+            for chunk in chunks:
+                in_flight.append(executor.submit(_process_song_chunk, chunk))
+                if len(in_flight) >= 8:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+        for song, (song_data, error_type, error_msg) in zip(songs, results()):
+            if song_data:
+                batch_data.append(song_data)
 
-    except Exception as e:
-        conn.rollback()
-        print(f"Error during bulk insert: {e}")
-        return 0
+                # Insert batch when full
+                if len(batch_data) >= batch_size:
+                    rows = bulk_insert_songs(conn, sink, batch_data)
+                    attempted = len(batch_data)
+                    batch_data = []
+                    if rows is None:
+                        # The rollback discarded this batch and every
+                        # uncommitted one before it
+                        with totals_lock:
+                            totals['failed'] += pending + attempted
+                            totals['processed'] += attempted
+                        pending = 0
+                        batches_since_commit = 0
+                        continue
+                    pending += rows
+                    batches_since_commit += 1
+                    # Every commit waits on the server; amortize it over
+                    # 10 batches (re-run safety after a rollback comes
+                    # from the (title, language) prescan — the sink's
+                    # ON CONFLICT clause can't deduplicate rows whose
+                    # ids are generated server-side)
+                    committed = 0
+                    if batches_since_commit >= 10:
+                        conn.commit()
+                        batches_since_commit = 0
+                        committed = pending
+                        pending = 0
+                    with totals_lock:
+                        totals['imported'] += committed
+                        totals['processed'] += attempted
+                        if show_progress:
+                            print(f"[{totals['processed']}/{total_files}] "
+                                  f"Imported: {totals['imported']} total", end='\r')
+            else:
+                error_rows.append([
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    song['filename'],
+                    song['language'],
+                    song['filepath'],
+                    error_type,
+                    error_msg
+                ])
+                with totals_lock:
+                    totals['failed'] += 1
+                    totals['processed'] += 1
+
+        # Insert remaining songs
+        if batch_data:
+            rows = bulk_insert_songs(conn, sink, batch_data)
+            if rows is None:
+                with totals_lock:
+                    totals['failed'] += pending + len(batch_data)
+                    totals['processed'] += len(batch_data)
+                pending = 0
+            else:
+                pending += rows
+                with totals_lock:
+                    totals['processed'] += len(batch_data)
+        conn.commit()
+        if pending:
+            with totals_lock:
+                totals['imported'] += pending
+    finally:
+        sink.close()
+        conn.close()
 
 def main():
     print("=" * 70)
@@ -165,11 +194,13 @@ def main():
 
     # Check dependencies
     if not check_antiword():
+        print("✗ antiword not found. Please install: sudo apt-get install antiword")
         return
+    print("✓ antiword found (for .doc files)\n")
 
     # Scan for song files
     print("Scanning directories...")
-    song_files = scan_song_files()
+    song_files = scan_song_dirs(SONG_DIRS)
 
     if not song_files:
         print("No song files found!")
@@ -185,70 +216,119 @@ def main():
 
     # Connect to database
     print("\nConnecting to PostgreSQL...")
-    conn = connect_db()
+    try:
+        conn = connect_db()
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
+        sys.exit(1)
     print("✓ Connected to database\n")
 
+    # Skip files already imported so re-runs only pay for new songs
+    existing = fetch_existing_songs(conn)
+    if existing:
+        total_before = len(song_files)
+        song_files = [s for s in song_files if (s['title'], s['language']) not in existing]
+        if len(song_files) < total_before:
+            print(f"Skipping {total_before - len(song_files)} already-imported songs")
+        if not song_files:
+            print("Nothing new to import!")
+            conn.close()
+            return
+
+    # Defer index maintenance to the end of the bulk load; each worker
+    # thread sets synchronous_commit = off on its own connection
+    index_defs = drop_song_indexes(conn)
+
     # Create error log
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     error_log_path = f"direct_import_errors_{timestamp}.csv"
     error_log = open(error_log_path, 'w', newline='', encoding='utf-8')
     error_writer = csv.writer(error_log)
     error_writer.writerow(['Timestamp', 'Filename', 'Language', 'Full Path', 'Error Type', 'Error Message'])
+    # Buffer error rows and write them once at the end; flushing per row
+    # serializes the loop behind stdio syscalls during error storms
+    error_rows = []
 
     print("Starting direct import...")
     print("-" * 70)
 
-    imported = 0
-    failed = 0
-    batch_size = 100
-    batch_data = []
+    # Larger batches amortize per-round-trip cost; override via IMPORT_BATCH_SIZE
+    batch_size = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
 
-    try:
-        for i, (filepath, language) in enumerate(song_files, 1):
-            filename = Path(filepath).name
+    # Languages share no rows or ids, so each gets its own connection and
+    # COPY stream; four insert pipelines run until WAL write saturates
+    by_language = {}
+    for song in song_files:
+        by_language.setdefault(song['language'], []).append(song)
 
-            # Process song
-            song_data, error_type, error_msg = process_song(filepath, language)
+    totals = {'processed': 0, 'imported': 0, 'failed': 0}
+    totals_lock = threading.Lock()
 
-            if song_data:
-                batch_data.append(song_data)
+    # Skip progress output entirely when stdout is piped
+    show_progress = sys.stdout.isatty()
 
-                # Insert batch when full
-                if len(batch_data) >= batch_size:
-                    rows = bulk_insert_songs(conn, batch_data)
-                    imported += rows
-                    batch_data = []
-                    print(f"[{i}/{len(song_files)}] Imported batch: {imported} total", end='\r')
-            else:
-                failed += 1
-                error_writer.writerow([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    filename,
-                    language,
-                    filepath,
-                    error_type,
-                    error_msg
-                ])
-                error_log.flush()
+    # A thread that dies must not look like a language that imported
+    # zero rows; collect failures and report them after the join
+    worker_errors = []
 
-        # Insert remaining songs
-        if batch_data:
-            rows = bulk_insert_songs(conn, batch_data)
-            imported += rows
+    def run_language(language, songs):
+        try:
+            import_language(songs, executor, batch_size, totals, totals_lock,
+                            error_rows, len(song_files), show_progress)
+        except Exception as e:
+            worker_errors.append((language, e))
+
+    try:
+        # One extraction pool shared by all language threads so the
+        # languages compete fairly for cores. forkserver children start
+        # from a clean helper process instead of fork()ing a process
+        # with running threads, which could inherit a held lock and
+        # hang the pool
+        mp_context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp_context) as executor:
+            # Start the forkserver before any language thread exists
+            executor.submit(os.getpid).result()
+
+            workers = [
+                threading.Thread(target=run_language, args=(language, songs))
+                for language, songs in by_language.items()
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        for language, error in worker_errors:
+            print(f"\n✗ {language} import failed: {error}")
 
         print(f"\n\n{'=' * 70}")
-        print(f"Import completed!")
+        print("Import completed with errors!" if worker_errors else "Import completed!")
         print(f"{'=' * 70}")
-        print(f"Successfully imported: {imported}")
-        print(f"Failed: {failed}")
+        print(f"Successfully imported: {totals['imported']}")
+        print(f"Failed: {totals['failed']}")
         print(f"Total processed: {len(song_files)}")
         print(f"Error log: {error_log_path}")
         print()
 
     finally:
+        # Rebuild even on crash or Ctrl-C: the dropped definitions only
+        # live in memory (and in the backup file as a last resort)
+        if index_defs:
+            print("\nRebuilding indexes...")
+            try:
+                conn.rollback()
+                recreate_song_indexes(conn, index_defs)
+            except Exception as e:
+                print(f"Index rebuild failed: {e}")
+                print(f"Restore by hand with: psql -f {INDEX_BACKUP_PATH}")
+        if error_rows:
+            error_writer.writerows(error_rows)
         error_log.close()
         conn.close()
 
+    if worker_errors:
+        sys.exit(1)
+
     # Prompt for reindex
     print("\n" + "=" * 70)
     print("NEXT STEP: Reindex songs to Typesense")
@@ -6,15 +6,17 @@ Imports songs from .doc/.docx files into the database
 
 import os
 import sys
-import json
-import requests
-from pathlib import Path
-import subprocess
+import asyncio
+import aiohttp
 import csv
 from datetime import datetime
 
+from readers import check_antiword, read_doc, read_docx
+from scan import scan_song_tree
+
 # Configuration
 API_URL = "http://localhost:8080/api"
+CONCURRENCY = 32  # parallel API requests in flight
 SONGS_BASE_DIR = "/mnt/c/Users/joelv/Downloads/Complete Song List 2024-20251208T122705Z-1-001/Complete Song List 2024"
 
 # Language mapping from folder names
@@ -27,44 +29,6 @@ LANGUAGE_MAP = {
     "Song database": "english"  # Default to English
 }
 
-def read_doc_file(filepath):
-    """Read .doc file using antiword or textract"""
-    try:
-        # Try using antiword first (faster)
-        result = subprocess.run(
-            ['antiword', filepath],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        return result.stdout
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        try:
-            # Fallback to textract
-            result = subprocess.run(
-                ['textract', filepath],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return result.stdout
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print(f"Warning: Could not read {filepath}, skipping...")
-            return None
-
-def read_docx_file(filepath):
-    """Read .docx file using python-docx"""
-    try:
-        from docx import Document
-        doc = Document(filepath)
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        return '\n'.join(full_text)
-    except Exception as e:
-        print(f"Error reading {filepath}: {e}")
-        return None
-
 def extract_title_from_filename(filename):
     """Extract clean title from filename"""
     # Remove extension
@@ -73,68 +37,109 @@ def extract_title_from_filename(filename):
     title = title.replace('_', ' ').strip()
     return title
 
-def detect_language_from_path(filepath):
-    """Detect language from folder path"""
-    path_parts = Path(filepath).parts
-    for part in path_parts:
-        if part in LANGUAGE_MAP:
-            return LANGUAGE_MAP[part]
-    return "english"  # Default
-
-def import_song(filepath, language):
-    """Import a single song file. Returns (success, error_type, error_message)"""
-    filename = os.path.basename(filepath)
+async def import_song(session, semaphore, song):
+    """Import a single song file. Returns (song, success, error_type, error_message)"""
+    filepath = song['filepath']
+    filename = song['filename']
     title = extract_title_from_filename(filename)
 
-    # Read file content
-    if filepath.endswith('.docx'):
-        content = read_docx_file(filepath)
-    elif filepath.endswith('.doc'):
-        content = read_doc_file(filepath)
+    # File extraction is blocking; run it in a worker thread so the event
+    # loop keeps other API requests in flight
+    loop = asyncio.get_running_loop()
+    # Match case-insensitively like the scan does, or a SONG.DOC that
+    # passed the scan would be rejected here as unsupported
+    lowered = filepath.lower()
+    if lowered.endswith('.docx'):
+        content = await loop.run_in_executor(None, read_docx, filepath)
+    elif lowered.endswith('.doc'):
+        content = await loop.run_in_executor(None, read_doc, filepath)
     else:
         error_msg = f"Unsupported file type: {filepath}"
         print(error_msg)
-        return False, "UNSUPPORTED_FILE_TYPE", error_msg
+        return song, False, "UNSUPPORTED_FILE_TYPE", error_msg
 
     if content is None:
         error_msg = f"Could not read file (corrupted or unreadable)"
         print(f"Warning: {error_msg}")
-        return False, "FILE_READ_ERROR", error_msg
+        return song, False, "FILE_READ_ERROR", error_msg
 
     if not content.strip():
         error_msg = f"Empty content for {filename}, skipping..."
         print(error_msg)
-        return False, "EMPTY_CONTENT", error_msg
+        return song, False, "EMPTY_CONTENT", error_msg
 
     # Prepare data
     song_data = {
         "title": title,
         "lyrics": content.strip(),
-        "language": language,
+        "language": song['language'],
         "content": content.strip()
     }
 
     try:
-        # Send to API
-        response = requests.post(f"{API_URL}/songs", json=song_data, timeout=30)
-        if response.status_code == 201:
-            return True, None, None
-        else:
-            error_msg = f"API error: {response.text}"
-            print(f"Error importing {filename}: {response.text}")
-            return False, "API_ERROR", error_msg
-    except requests.exceptions.Timeout:
+        # Send to API (semaphore caps requests in flight; keepalive reuses connections)
+        async with semaphore:
+            async with session.post(f"{API_URL}/songs", json=song_data) as response:
+                if response.status == 201:
+                    return song, True, None, None
+                else:
+                    text = await response.text()
+                    error_msg = f"API error: {text}"
+                    print(f"Error importing {filename}: {text}")
+                    return song, False, "API_ERROR", error_msg
+    except asyncio.TimeoutError:
         error_msg = "API timeout (>30s)"
         print(f"Timeout importing {filename}")
-        return False, "TIMEOUT", error_msg
-    except requests.exceptions.ConnectionError as e:
+        return song, False, "TIMEOUT", error_msg
+    except aiohttp.ClientConnectionError as e:
         error_msg = f"Connection error: {str(e)}"
         print(f"Connection error importing {filename}: {e}")
-        return False, "CONNECTION_ERROR", error_msg
+        return song, False, "CONNECTION_ERROR", error_msg
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         print(f"Failed to import {filename}: {e}")
-        return False, "UNKNOWN_ERROR", error_msg
+        return song, False, "UNKNOWN_ERROR", error_msg
+
+async def import_all_songs(song_files, error_rows):
+    """Import all songs concurrently. Returns (imported, failed)"""
+    total_files = len(song_files)
+    imported = 0
+    failed = 0
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [
+            asyncio.create_task(import_song(session, semaphore, song))
+            for song in song_files
+        ]
+
+        for i, task in enumerate(asyncio.as_completed(tasks), 1):
+            song, success, error_type, error_msg = await task
+
+            if success:
+                imported += 1
+                print(f"[{i}/{total_files}] ✓ {song['filename']}")
+            else:
+                failed += 1
+                print(f"[{i}/{total_files}] ✗ {song['filename']} (failed)")
+                # Buffer the error row; the CSV is written once at the end
+                error_rows.append([
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    song['filename'],
+                    song['language'],
+                    song['filepath'],
+                    error_type,
+                    error_msg
+                ])
+
+            # Progress update every 100 songs
+            if i % 100 == 0:
+                print(f"\nProgress: {imported} imported, {failed} failed\n")
+
+    return imported, failed
 
 def main():
     # Check for --yes flag
@@ -145,20 +150,10 @@ def main():
     print("=" * 70)
     print()
 
-    # Check if required packages are installed
-    try:
-        from docx import Document
-    except ImportError:
-        print("Installing required package: python-docx...")
-        subprocess.run([sys.executable, '-m', 'pip', 'install', 'python-docx'], check=True)
-        print("Package installed successfully!")
-        print()
-
     # Check if antiword is available
-    try:
-        subprocess.run(['which', 'antiword'], capture_output=True, check=True)
+    if check_antiword():
         print("✓ antiword found (for .doc files)")
-    except subprocess.CalledProcessError:
+    else:
         print("✗ antiword not found - .doc files may fail to import")
         print("  Install with: sudo apt-get install antiword")
 
@@ -167,9 +162,7 @@ def main():
     print()
 
     # Find all song files
-    song_files = []
-    for ext in ['*.doc', '*.docx']:
-        song_files.extend(Path(SONGS_BASE_DIR).rglob(ext))
+    song_files = scan_song_tree(SONGS_BASE_DIR, LANGUAGE_MAP)
 
     total_files = len(song_files)
     print(f"Found {total_files} song files to import")
@@ -197,10 +190,6 @@ def main():
     print("Starting import...")
     print("-" * 70)
 
-    imported = 0
-    failed = 0
-    skipped = 0
-
     # Create error log file
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     error_log_path = f"import_errors_{timestamp}.csv"
@@ -211,35 +200,12 @@ def main():
     print(f"Error log will be written to: {error_log_path}")
     print()
 
+    error_rows = []
     try:
-        for i, filepath in enumerate(song_files, 1):
-            filepath_str = str(filepath)
-            language = detect_language_from_path(filepath_str)
-
-            print(f"[{i}/{total_files}] Importing: {filepath.name} ({language})...", end=" ")
-
-            success, error_type, error_msg = import_song(filepath_str, language)
-            if success:
-                imported += 1
-                print("✓")
-            else:
-                failed += 1
-                print("✗ (failed)")
-                # Log error to CSV
-                error_writer.writerow([
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    filepath.name,
-                    language,
-                    filepath_str,
-                    error_type,
-                    error_msg
-                ])
-                error_log.flush()  # Ensure it's written immediately
-
-            # Progress update every 100 songs
-            if i % 100 == 0:
-                print(f"\nProgress: {imported} imported, {failed} failed\n")
+        imported, failed = asyncio.run(import_all_songs(song_files, error_rows))
     finally:
+        if error_rows:
+            error_writer.writerows(error_rows)
         error_log.close()
 
     print()
@@ -6,15 +6,18 @@ Bypasses REST API for fast bulk import
 
 import os
 import sys
-from pathlib import Path
-import subprocess
-from docx import Document
-import psycopg2
-from psycopg2.extras import execute_batch
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import psycopg
 import csv
 from datetime import datetime
 import uuid
 
+from readers import check_antiword, read_chunk
+from scan import scan_song_dirs
+from sinks import (INDEX_BACKUP_PATH, CopySink, drop_song_indexes,
+                   fetch_existing_songs, recreate_song_indexes)
+
 # Database configuration
 DB_HOST = "localhost"
 DB_PORT = "5432"
@@ -31,81 +34,11 @@ SONG_DIRS = {
 }
 
 
-def check_antiword():
-    """Check if antiword is available"""
-    try:
-        subprocess.run(['antiword', '-v'], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
-
-
-def read_doc_file(filepath):
-    """Read content from .doc file using antiword"""
-    try:
-        result = subprocess.run(
-            ['antiword', '-t', str(filepath)],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
-        print(f"Error reading .doc file {filepath}: {e}")
-        return None
-
-
-def read_docx_file(filepath):
-    """Read content from .docx file using python-docx"""
-    try:
-        doc = Document(filepath)
-        text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-        return text.strip()
-    except Exception as e:
-        print(f"Error reading .docx file {filepath}: {e}")
-        return None
-
-
-def read_song_file(filepath):
-    """Read song content from file"""
-    filepath = Path(filepath)
-
-    if filepath.suffix.lower() == '.doc':
-        return read_doc_file(filepath)
-    elif filepath.suffix.lower() == '.docx':
-        return read_docx_file(filepath)
-    else:
-        return None
-
-
-def scan_songs():
-    """Scan all song directories and return list of song files"""
-    songs = []
-
-    for language, directory in SONG_DIRS.items():
-        dir_path = Path(directory)
-        if not dir_path.exists():
-            print(f"Warning: Directory not found: {directory}")
-            continue
-
-        for filepath in dir_path.glob('*'):
-            if filepath.suffix.lower() in ['.doc', '.docx'] and filepath.is_file():
-                songs.append({
-                    'filepath': str(filepath),
-                    'filename': filepath.name,
-                    'language': language
-                })
-
-    return songs
-
-
-def import_songs_batch(songs, batch_size=100):
+def import_songs_batch(songs, batch_size=1000):
     """Import songs directly to PostgreSQL in batches"""
 
     # Connect to database
-    conn = psycopg2.connect(
+    conn = psycopg.connect(
         host=DB_HOST,
         port=DB_PORT,
         dbname=DB_NAME,
@@ -119,16 +52,36 @@ def import_songs_batch(songs, batch_size=100):
     error_log = open(error_log_path, 'w', newline='', encoding='utf-8')
     error_writer = csv.writer(error_log)
     error_writer.writerow(['Timestamp', 'Filename', 'Language', 'Full Path', 'Error Type', 'Error Message'])
+    # Buffer error rows and write them once at the end; flushing per row
+    # serializes the loop behind stdio syscalls during error storms
+    error_rows = []
 
+    index_defs = []
     try:
         cursor = conn.cursor()
 
+        # Bulk-load posture: skip the WAL flush wait on commit (a crash just
+        # means re-running the import) and defer index maintenance to the end
+        cursor.execute("SET synchronous_commit = off")
+        conn.commit()
+        index_defs = drop_song_indexes(conn)
+
         # Prepare batch data
+        sink = CopySink(conn)
         batch = []
         imported = 0
         failed = 0
         skipped = 0
 
+        # Skip files already imported so re-runs only pay for new songs
+        existing = fetch_existing_songs(conn)
+        if existing:
+            total_before = len(songs)
+            songs = [s for s in songs if (s['title'], s['language']) not in existing]
+            if len(songs) < total_before:
+                skipped += total_before - len(songs)
+                print(f"Skipping {total_before - len(songs)} already-imported songs")
+
         print("\n" + "="*70)
         print("DIRECT POSTGRESQL SONG IMPORT")
         print("="*70)
@@ -136,38 +89,42 @@ def import_songs_batch(songs, batch_size=100):
         print(f"Batch size: {batch_size}")
         print(f"Error log: {error_log_path}\n")
 
-        for i, song_info in enumerate(songs, 1):
+        # Per-file prints are synchronous terminal writes; throttle them,
+        # and skip progress entirely when output is piped
+        show_progress = sys.stdout.isatty()
+
+        # Read files in parallel across all cores; keep DB work on the main thread
+        chunks = [songs[start:start + 50] for start in range(0, len(songs), 50)]
+        executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+        results = itertools.chain.from_iterable(executor.map(read_chunk, chunks))
+
+        for i, (song_info, content) in enumerate(zip(songs, results), 1):
             filepath = song_info['filepath']
             filename = song_info['filename']
             language = song_info['language']
 
-            # Read song content
-            content = read_song_file(filepath)
-
             if content is None:
-                error_writer.writerow([
+                error_rows.append([
                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     filename, language, filepath,
                     "FILE_READ_ERROR", "Could not read file"
                 ])
-                error_log.flush()
                 failed += 1
                 print(f"[{i}/{len(songs)}] ✗ {filename} (read error)")
                 continue
 
             if not content.strip():
-                error_writer.writerow([
+                error_rows.append([
                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     filename, language, filepath,
                     "EMPTY_CONTENT", "File has no content"
                 ])
-                error_log.flush()
                 skipped += 1
                 print(f"[{i}/{len(songs)}] - {filename} (empty)")
                 continue
 
-            # Extract title from filename (remove extension)
-            title = Path(filename).stem
+            # Title was pre-computed at scan time
+            title = song_info['title']
 
             # Prepare data for batch insert
             song_id = str(uuid.uuid4())
@@ -183,49 +140,45 @@ def import_songs_batch(songs, batch_size=100):
             # Insert batch when it reaches batch_size
             if len(batch) >= batch_size:
                 try:
-                    execute_batch(cursor, """
-                        INSERT INTO songs (id, title, lyrics, language, author, translation, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                    """, batch)
+                    sink.insert(batch)
                     conn.commit()
                     imported += len(batch)
                     print(f"[{i}/{len(songs)}] ✓ Batch inserted ({len(batch)} songs)")
                     batch = []
                 except Exception as e:
                     conn.rollback()
-                    # Log all songs in failed batch
+                    # Log all songs in failed batch (one timestamp for the batch)
+                    error_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     for song_data in batch:
-                        error_writer.writerow([
-                            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        error_rows.append([
+                            error_time,
                             "Batch", language, "",
                             "DB_ERROR", str(e)
                         ])
-                    error_log.flush()
                     failed += len(batch)
                     print(f"[{i}/{len(songs)}] ✗ Batch failed: {e}")
                     batch = []
-            else:
-                print(f"[{i}/{len(songs)}] + {filename}")
+            elif show_progress and i % 50 == 0:
+                print(f"[{i}/{len(songs)}] processed")
+
+        executor.shutdown()
 
         # Insert remaining songs in batch
         if batch:
             try:
-                execute_batch(cursor, """
-                    INSERT INTO songs (id, title, lyrics, language, author, translation, created_at, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
-                """, batch)
+                sink.insert(batch)
                 conn.commit()
                 imported += len(batch)
                 print(f"\n✓ Final batch inserted ({len(batch)} songs)")
             except Exception as e:
                 conn.rollback()
+                error_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 for song_data in batch:
-                    error_writer.writerow([
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    error_rows.append([
+                        error_time,
                         "Batch", language, "",
                         "DB_ERROR", str(e)
                     ])
-                error_log.flush()
                 failed += len(batch)
                 print(f"\n✗ Final batch failed: {e}")
 
@@ -233,10 +186,23 @@ def import_songs_batch(songs, batch_size=100):
         cursor.execute("UPDATE edit_count SET count = count + %s", (imported,))
         conn.commit()
 
+        sink.close()
         cursor.close()
 
     finally:
+        # Rebuild even on crash or Ctrl-C: the dropped definitions only
+        # live in memory (and in the backup file as a last resort)
+        if index_defs:
+            print("\nRebuilding indexes...")
+            try:
+                conn.rollback()
+                recreate_song_indexes(conn, index_defs)
+            except Exception as e:
+                print(f"Index rebuild failed: {e}")
+                print(f"Restore by hand with: psql -f {INDEX_BACKUP_PATH}")
         conn.close()
+        if error_rows:
+            error_writer.writerows(error_rows)
         error_log.close()
 
     return imported, failed, skipped
@@ -256,7 +222,7 @@ def main():
 
     # Scan songs
     print("\nScanning directories...")
-    songs = scan_songs()
+    songs = scan_song_dirs(SONG_DIRS)
     print(f"Found {len(songs)} song files")
 
     if not songs:
@@ -281,7 +247,9 @@ def main():
 
     # Import songs
     print("\nStarting direct import...")
-    imported, failed, skipped = import_songs_batch(songs, batch_size=100)
+    # Larger batches amortize per-round-trip cost; override via IMPORT_BATCH_SIZE
+    batch_size = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    imported, failed, skipped = import_songs_batch(songs, batch_size=batch_size)
 
     # Summary
     print("\n" + "="*70)
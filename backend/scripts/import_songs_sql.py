@@ -1,18 +1,19 @@
 #!/usr/bin/env python3
 """
 Direct SQL song import script using psql
-Generates SQL statements and executes them via psql
+Generates COPY data and streams it to psql over stdin
 """
 
+import io
 import os
 import sys
-from pathlib import Path
+import itertools
 import subprocess
-from docx import Document
+from concurrent.futures import ProcessPoolExecutor
 import csv
 from datetime import datetime
-import uuid
-import tempfile
+
+from readers import check_antiword, read_doc, read_docs_batch, read_docx
 
 # Song directories
 SONG_DIRS = {
@@ -22,173 +23,335 @@ SONG_DIRS = {
     'tamil': '/mnt/c/Users/joelv/Downloads/Complete Song List 2024-20251208T122705Z-1-001/Complete Song List 2024/Joshua Tamil Slides',
 }
 
+# Column list shared by the COPY command and the INSERT fallback; id is
+# omitted so the server generates it via the gen_random_uuid() default
+SONG_COLUMNS = "title, lyrics, language, author, translation, created_at, updated_at"
 
-def check_antiword():
-    """Check if antiword is available"""
-    try:
-        subprocess.run(['antiword', '-v'], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+# Idempotent; makes sure omitting id from the column list works, and
+# moves UUID generation off Python and off the wire entirely
+SET_ID_DEFAULT = "ALTER TABLE songs ALTER COLUMN id SET DEFAULT gen_random_uuid();"
 
+# -X skips psqlrc, -q drops row-count chatter, ON_ERROR_STOP fails fast
+# instead of executing the rest of the script past a bad row
+PSQL_CMD = ['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1',
+            '-U', 'teleprompter_user', '-d', 'teleprompter', '-h', 'localhost']
+PSQL_ENV = {**os.environ, 'PGPASSWORD': 'teleprompter_pass_2024'}
 
-def read_doc_file(filepath):
-    """Read content from .doc file using antiword"""
-    try:
-        result = subprocess.run(
-            ['antiword', '-t', str(filepath)],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception as e:
-        return None
+# Bulk-load session posture: skip the WAL flush wait on commit (a crash
+# just means re-running the import) and silence notice-level chatter
+SQL_PREAMBLE = "SET synchronous_commit = off;\nSET client_min_messages = warning;\n"
 
+# Per-row output is a stdio call per song; keep it behind -v and emit a
+# single throttled progress line otherwise
+VERBOSE = '-v' in sys.argv or '--verbose' in sys.argv
 
-def read_docx_file(filepath):
-    """Read content from .docx file using python-docx"""
-    try:
-        doc = Document(filepath)
-        text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-        return text.strip()
-    except Exception as e:
+
+def read_song_file(filepath, suffix):
+    """Read song content from file; suffix is pre-computed at scan time"""
+    if suffix == '.doc':
+        return read_doc(filepath)
+    elif suffix == '.docx':
+        return read_docx(filepath)
+    else:
         return None
 
 
-def read_song_file(filepath):
-    """Read song content from file"""
-    filepath = Path(filepath)
+def read_song_chunk(songs):
+    """Read a chunk of song dicts in one worker, batching antiword calls
+
+    One antiword invocation per 50 .doc files instead of one per file;
+    paths the batch missed fall back to a per-file read.
+    """
+    doc_paths = [s['filepath'] for s in songs if s['suffix'] == '.doc']
+    doc_texts = read_docs_batch(doc_paths) if doc_paths else {}
+    contents = []
+    for song in songs:
+        filepath = song['filepath']
+        if filepath in doc_texts:
+            contents.append(doc_texts[filepath])
+        else:
+            contents.append(read_song_file(filepath, song['suffix']))
+    return contents
 
-    if filepath.suffix.lower() == '.doc':
-        return read_doc_file(filepath)
-    elif filepath.suffix.lower() == '.docx':
-        return read_docx_file(filepath)
-    else:
-        return None
+
+# Translation table: one C-level pass over the string instead of a
+# scan-and-copy per replaced character
+_SQL_ESCAPE = str.maketrans({"'": "''"})
 
 
 def escape_sql(text):
     """Escape single quotes for SQL"""
     if text is None:
         return ''
-    return text.replace("'", "''")
+    return text.translate(_SQL_ESCAPE)
+
+
+def fmt_row(row):
+    """Format one song tuple as a quoted VALUES row"""
+    return "(" + ",".join("'" + escape_sql(value) + "'" for value in row) + ")"
+
+
+def fetch_existing_songs():
+    """Return the frozenset of (title, language) pairs already in songs
+
+    Lets re-runs skip reading files that are already imported instead of
+    paying antiword/XML parsing for every file every time. Uses chr(31)
+    (the unit separator) as a delimiter no title will contain.
+    """
+    try:
+        result = subprocess.run(
+            PSQL_CMD + ['-At', '-c', "SELECT title||chr(31)||language FROM songs"],
+            env=PSQL_ENV,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        if result.returncode != 0:
+            return frozenset()
+        existing = set()
+        for line in result.stdout.splitlines():
+            title, sep, language = line.rpartition('\x1f')
+            if sep:
+                existing.add((title, language))
+        return frozenset(existing)
+    except Exception:
+        return frozenset()
 
 
 def scan_songs():
     """Scan all song directories and return list of song files"""
     songs = []
+    tiny = 0
 
     for language, directory in SONG_DIRS.items():
-        dir_path = Path(directory)
-        if not dir_path.exists():
+        if not os.path.isdir(directory):
             print(f"Warning: Directory not found: {directory}")
             continue
 
-        for filepath in dir_path.glob('*'):
-            if filepath.suffix.lower() in ['.doc', '.docx'] and filepath.is_file():
-                songs.append({
-                    'filepath': str(filepath),
-                    'filename': filepath.name,
-                    'language': language
-                })
+        # scandir's DirEntry carries the file type from the directory read
+        # itself, so no per-entry stat or Path allocation is needed
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                name = entry.name
+                stem, suffix = os.path.splitext(name)
+                suffix = suffix.lower()
+                if suffix in ('.doc', '.docx'):
+                    # Even an empty OLE/zip container is bigger than
+                    # this; skip junk files without paying a read
+                    if entry.stat().st_size < 64:
+                        tiny += 1
+                        continue
+                    # Stem and suffix are parsed once here; the hot loop
+                    # never re-derives them
+                    songs.append({
+                        'filepath': entry.path,
+                        'filename': name,
+                        'stem': stem,
+                        'suffix': suffix,
+                        'language': language
+                    })
+
+    if tiny:
+        print(f"Skipping {tiny} files too small to hold lyrics")
 
     return songs
 
 
-def generate_sql_inserts(songs):
-    """Generate SQL INSERT statements for all songs"""
-
-    # Create error log
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    error_log_path = f"import_errors_sql_{timestamp}.csv"
-    error_log = open(error_log_path, 'w', newline='', encoding='utf-8')
-    error_writer = csv.writer(error_log)
-    error_writer.writerow(['Timestamp', 'Filename', 'Language', 'Full Path', 'Error Type', 'Error Message'])
+def generate_copy_rows(songs, stats, error_rows):
+    """Yield one song tuple at a time as extraction completes
 
-    sql_statements = []
-    imported = 0
-    failed = 0
-    skipped = 0
+    Generator stage of the scan -> parse -> load pipeline: rows are
+    consumed straight into the psql pipe as the pool finishes files, so
+    the lyrics for the whole library are never held in memory at once.
+    Counters accumulate into stats and failures into error_rows
+    in-flight.
+    """
+    total = len(songs)
 
-    print("\n" + "="*70)
-    print("GENERATING SQL INSERTS")
-    print("="*70)
-    print(f"\nProcessing {len(songs)} songs...\n")
-
-    for i, song_info in enumerate(songs, 1):
-        filepath = song_info['filepath']
-        filename = song_info['filename']
-        language = song_info['language']
-
-        # Read song content
-        content = read_song_file(filepath)
-
-        if content is None:
-            error_writer.writerow([
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                filename, language, filepath,
-                "FILE_READ_ERROR", "Could not read file"
-            ])
-            error_log.flush()
-            failed += 1
-            print(f"[{i}/{len(songs)}] ✗ {filename} (read error)")
-            continue
+    # One timestamp for the whole run; re-reading the clock and
+    # re-formatting it per row buys nothing for a bulk import
+    now = datetime.now().isoformat(sep=' ', timespec='seconds')
 
-        if not content.strip():
-            error_writer.writerow([
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                filename, language, filepath,
-                "EMPTY_CONTENT", "File has no content"
-            ])
-            error_log.flush()
-            skipped += 1
-            print(f"[{i}/{len(songs)}] - {filename} (empty)")
-            continue
-
-        # Extract title from filename (remove extension)
-        title = Path(filename).stem
-
-        # Generate UUID
-        song_id = str(uuid.uuid4())
-
-        # Escape content for SQL
-        title_escaped = escape_sql(title)
-        content_escaped = escape_sql(content)
-
-        # Generate INSERT statement
-        sql = f"INSERT INTO songs (id, title, lyrics, language, author, translation, created_at, updated_at) VALUES ('{song_id}', '{title_escaped}', '{content_escaped}', '{language}', '', 'no', NOW(), NOW());\n"
-        sql_statements.append(sql)
+    # Read and parse files in parallel across all cores; the error log
+    # and row building stay single-threaded in the main process
+    chunks = [songs[start:start + 50] for start in range(0, len(songs), 50)]
+    executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    try:
+        contents = itertools.chain.from_iterable(executor.map(read_song_chunk, chunks))
+
+        for i, (song_info, content) in enumerate(zip(songs, contents), 1):
+            filepath = song_info['filepath']
+            filename = song_info['filename']
+            language = song_info['language']
+
+            if content is None:
+                error_rows.append([
+                    datetime.now().isoformat(sep=' ', timespec='seconds'),
+                    filename, language, filepath,
+                    "FILE_READ_ERROR", "Could not read file"
+                ])
+                stats['failed'] += 1
+                if VERBOSE:
+                    print(f"[{i}/{total}] ✗ {filename} (read error)")
+                continue
+
+            if not content.strip():
+                error_rows.append([
+                    datetime.now().isoformat(sep=' ', timespec='seconds'),
+                    filename, language, filepath,
+                    "EMPTY_CONTENT", "File has no content"
+                ])
+                stats['skipped'] += 1
+                if VERBOSE:
+                    print(f"[{i}/{total}] - {filename} (empty)")
+                continue
+
+            stats['imported'] += 1
+            if i % 500 == 0:
+                sys.stdout.write(f"\r[{i}/{total}] {stats['imported']} ok, "
+                                 f"{stats['failed']} err, {stats['skipped']} empty")
+                sys.stdout.flush()
+
+            # Plain tuple with the pre-computed title; the sink does the
+            # quoting and the server fills in the id
+            yield (song_info['stem'], content, language, '', 'no', now, now)
+    finally:
+        executor.shutdown()
+
+
+def execute_copy(copy_rows, stats):
+    """Stream COPY rows into psql over stdin
+
+    One COPY statement replaces one INSERT per song: the server parses
+    and plans a single statement and appends rows, instead of going
+    through parse/plan/execute per row. Takes the row generator, so the
+    server loads rows while extraction is still running; the edit_count
+    update is written after the data since the final count is only known
+    then.
+    """
+    proc = None
+    try:
+        proc = subprocess.Popen(
+            PSQL_CMD,
+            env=PSQL_ENV,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
 
-        imported += 1
-        if i % 100 == 0:
-            print(f"[{i}/{len(songs)}] Processed {i} songs...")
+        try:
+            proc.stdin.write(
+                f"{SQL_PREAMBLE}BEGIN;\n{SET_ID_DEFAULT}\nCOPY songs ({SONG_COLUMNS}) FROM STDIN;\n".encode('utf-8')
+            )
+
+            # csv does the COPY escaping in C: delimiter, backslash, CR and
+            # LF all come out backslashed, which COPY reads as the character
+            # itself; rows end in \r\n, which COPY accepts as a line end.
+            # Flushed to the pipe every ~64 KiB so the payload streams.
+            buf = io.StringIO()
+            writer = csv.writer(buf, delimiter='\t', lineterminator='\r\n',
+                                quoting=csv.QUOTE_NONE, escapechar='\\')
+            for row in copy_rows:
+                writer.writerow(row)
+                if buf.tell() >= 65536:
+                    proc.stdin.write(buf.getvalue().encode('utf-8'))
+                    buf.seek(0)
+                    buf.truncate()
+            buf.write('\\.\n')  # end-of-data marker
+            proc.stdin.write(buf.getvalue().encode('utf-8'))
+
+            proc.stdin.write(
+                f"UPDATE edit_count SET count = count + {stats['imported']};\nCOMMIT;\n".encode('utf-8')
+            )
+        except BrokenPipeError:
+            # psql aborted early; fall through to report its stderr
+            # rather than the broken-pipe symptom
+            pass
+
+        stdout, stderr = proc.communicate(timeout=600)
+
+        if proc.returncode != 0:
+            print(f"\nError executing COPY:")
+            print(stderr.decode('utf-8', errors='replace'))
+            return False
 
-    error_log.close()
+        return True
+    except Exception as e:
+        # Make sure psql is dead before returning: its stdin may already
+        # hold the full payload and COMMIT, and the caller's fallback
+        # would double-import everything if it finished on its own
+        if proc is not None:
+            proc.kill()
+            proc.communicate()
+        print(f"\nError: {e}")
+        return False
 
-    return sql_statements, imported, failed, skipped, error_log_path
 
+def execute_multirow_inserts(copy_rows, stats, batch_size=1000):
+    """Fallback: load songs as multi-row INSERT ... VALUES statements
 
-def execute_sql_file(sql_file):
-    """Execute SQL file using psql"""
+    For when COPY is not an option (e.g., per-row triggers must fire).
+    Batching 1000 rows per statement still plans once per batch instead
+    of once per song; one BEGIN/COMMIT wraps the whole sequence. Takes
+    the row generator, same as execute_copy.
+    """
+    proc = None
     try:
-        result = subprocess.run(
-            ['psql', '-U', 'teleprompter_user', '-d', 'teleprompter', '-h', 'localhost', '-f', sql_file],
-            env={**os.environ, 'PGPASSWORD': 'teleprompter_pass_2024'},
-            capture_output=True,
-            text=True,
-            timeout=600
+        proc = subprocess.Popen(
+            PSQL_CMD,
+            env=PSQL_ENV,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
         )
 
-        if result.returncode != 0:
-            print(f"\nError executing SQL:")
-            print(result.stderr)
+        try:
+            # Write one statement at a time so psql starts executing while
+            # later batches are still being formatted, and the full SQL text
+            # is never held in memory at once
+            proc.stdin.write(SQL_PREAMBLE.encode('utf-8'))
+            proc.stdin.write(b"BEGIN;\n")
+            proc.stdin.write(SET_ID_DEFAULT.encode('utf-8') + b"\n")
+            batch = []
+            for row in copy_rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    statement = (
+                        f"INSERT INTO songs ({SONG_COLUMNS}) VALUES\n"
+                        + ",\n".join(fmt_row(r) for r in batch)
+                        + ";\n"
+                    )
+                    proc.stdin.write(statement.encode('utf-8'))
+                    batch = []
+            if batch:
+                statement = (
+                    f"INSERT INTO songs ({SONG_COLUMNS}) VALUES\n"
+                    + ",\n".join(fmt_row(r) for r in batch)
+                    + ";\n"
+                )
+                proc.stdin.write(statement.encode('utf-8'))
+            proc.stdin.write(f"UPDATE edit_count SET count = count + {stats['imported']};\nCOMMIT;\n".encode('utf-8'))
+        except BrokenPipeError:
+            # psql aborted early; fall through to report its stderr
+            # rather than the broken-pipe symptom
+            pass
+
+        stdout, stderr = proc.communicate(timeout=600)
+
+        if proc.returncode != 0:
+            print(f"\nError executing INSERTs:")
+            print(stderr.decode('utf-8', errors='replace'))
             return False
 
         return True
     except Exception as e:
+        # Make sure psql is dead before returning; ON_ERROR_STOP aside,
+        # a live psql could still commit what it was fed
+        if proc is not None:
+            proc.kill()
+            proc.communicate()
         print(f"\nError: {e}")
         return False
 
@@ -214,6 +377,17 @@ def main():
         print("\nNo songs found!")
         sys.exit(1)
 
+    # Skip files already imported so re-runs only pay for new songs
+    existing = fetch_existing_songs()
+    if existing:
+        total_before = len(songs)
+        songs = [s for s in songs if (s['stem'], s['language']) not in existing]
+        if len(songs) < total_before:
+            print(f"Skipping {total_before - len(songs)} already-imported songs")
+        if not songs:
+            print("\nNothing new to import!")
+            sys.exit(0)
+
     # Show breakdown
     by_language = {}
     for song in songs:
@@ -230,37 +404,27 @@ def main():
         print("Import cancelled")
         sys.exit(0)
 
-    # Generate SQL
-    print("\nGenerating SQL statements...")
-    sql_statements, imported, failed, skipped, error_log = generate_sql_inserts(songs)
+    # Stream scan -> parse -> COPY in one pass; the fallback re-runs the
+    # pipeline since rows are never materialized
+    print(f"\nStreaming {len(songs)} songs to psql via COPY...")
+    stats = {'imported': 0, 'failed': 0, 'skipped': 0}
+    error_rows = []
+    success = execute_copy(generate_copy_rows(songs, stats, error_rows), stats)
 
-    if not sql_statements:
-        print("\nNo songs to import!")
-        sys.exit(1)
+    if not success:
+        print("\nCOPY failed, retrying with multi-row INSERTs...")
+        stats = {'imported': 0, 'failed': 0, 'skipped': 0}
+        error_rows = []
+        success = execute_multirow_inserts(generate_copy_rows(songs, stats, error_rows), stats)
 
-    # Write SQL to temp file
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.sql', delete=False, encoding='utf-8') as f:
-        sql_file = f.name
-        f.write("-- Begin transaction\n")
-        f.write("BEGIN;\n\n")
-        for sql in sql_statements:
-            f.write(sql)
-        f.write("\n-- Update edit count\n")
-        f.write(f"UPDATE edit_count SET count = count + {imported};\n\n")
-        f.write("-- Commit transaction\n")
-        f.write("COMMIT;\n")
-
-    print(f"\nSQL file created: {sql_file}")
-    print(f"Executing SQL via psql...")
-
-    # Execute SQL
-    success = execute_sql_file(sql_file)
-
-    # Cleanup
-    try:
-        os.unlink(sql_file)
-    except:
-        pass
+    # Write the error log once at the end
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    error_log_path = f"import_errors_sql_{timestamp}.csv"
+    with open(error_log_path, 'w', newline='', encoding='utf-8') as error_log:
+        error_writer = csv.writer(error_log)
+        error_writer.writerow(['Timestamp', 'Filename', 'Language', 'Full Path', 'Error Type', 'Error Message'])
+        if error_rows:
+            error_writer.writerows(error_rows)
 
     if not success:
         print("\n✗ Import failed!")
@@ -270,12 +434,12 @@ def main():
     print("\n" + "="*70)
     print("IMPORT COMPLETE")
     print("="*70)
-    print(f"Imported: {imported}")
-    print(f"Failed: {failed}")
-    print(f"Skipped: {skipped}")
+    print(f"Imported: {stats['imported']}")
+    print(f"Failed: {stats['failed']}")
+    print(f"Skipped: {stats['skipped']}")
     print(f"Total: {len(songs)}")
-    print(f"Error log: {error_log}")
-    print(f"\nSuccess rate: {imported/len(songs)*100:.1f}%")
+    print(f"Error log: {error_log_path}")
+    print(f"\nSuccess rate: {stats['imported']/len(songs)*100:.1f}%")
     print("\nNext step: Reindex songs to Typesense")
     print("  curl -X POST http://localhost:8080/api/admin/reindex")
 
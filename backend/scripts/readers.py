@@ -0,0 +1,134 @@
+"""
+Shared .doc/.docx text extraction for the song import scripts
+"""
+
+import os
+import shutil
+import subprocess
+import zipfile
+import xml.etree.ElementTree as ET
+
+DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+# Resolved once; every subprocess call execs the absolute path instead
+# of re-walking PATH
+ANTIWORD_BIN = shutil.which('antiword')
+
+
+def check_antiword():
+    """Check if antiword is available"""
+    return ANTIWORD_BIN is not None
+
+
+def read_doc(filepath):
+    """Read content from a single .doc file using antiword
+
+    Forces antiword's UTF-8 mapping and decodes explicitly instead of
+    trusting the locale: with text=True a non-UTF-8 locale would silently
+    corrupt Malayalam/Hindi/Tamil lyrics, and it also ran a redundant
+    decode pass.
+    """
+    try:
+        result = subprocess.run(
+            [ANTIWORD_BIN or 'antiword', '-m', 'UTF-8.txt', '-w', '0', str(filepath)],
+            capture_output=True,
+            timeout=10,
+            close_fds=False
+        )
+        if result.returncode == 0:
+            return result.stdout.decode('utf-8', errors='replace').strip()
+        return None
+    except Exception as e:
+        print(f"Warning: Could not read {filepath}: {e}")
+        return None
+
+
+def read_docs_batch(filepaths):
+    """Read many .doc files, batching antiword invocations
+
+    One shell loop per 50 files avoids a fork+exec per file. Returns a
+    dict of filepath -> text; files antiword failed on are omitted, so
+    callers fall back to a per-file read (and its error classification)
+    for anything missing from the dict.
+    """
+    texts = {}
+    # The resolved antiword path comes in as $1 so the shell does not
+    # re-search PATH per file. The path marker is only printed when
+    # antiword exits zero, so corrupt files don't masquerade as empty
+    script = ('aw="$1"; shift; for f in "$@"; do '
+              'if out=$("$aw" -m UTF-8.txt -w 0 "$f" 2>/dev/null); '
+              'then printf "\\0%s\\0%s" "$f" "$out"; fi; done')
+    for start in range(0, len(filepaths), 50):
+        chunk = filepaths[start:start + 50]
+        try:
+            result = subprocess.run(
+                ['sh', '-c', script, 'antiword-batch', ANTIWORD_BIN or 'antiword'] + chunk,
+                capture_output=True,
+                timeout=10 * len(chunk),
+                close_fds=False
+            )
+        except Exception as e:
+            print(f"Warning: antiword batch failed: {e}")
+            continue
+        # Output alternates NUL-delimited path markers and antiword text;
+        # decode as UTF-8 ourselves rather than via the locale
+        parts = result.stdout.split(b'\0')
+        for path, text in zip(parts[1::2], parts[2::2]):
+            texts[path.decode('utf-8', errors='replace')] = text.decode('utf-8', errors='replace').strip()
+    return texts
+
+
+def read_docx(filepath):
+    """Read content from a .docx file by stream-parsing word/document.xml
+
+    Only the <w:t> text nodes are needed, so parsing the zip entry with
+    iterparse skips the full python-docx document model and keeps memory
+    flat regardless of file size.
+    """
+    try:
+        with open(filepath, 'rb') as raw:
+            # The zip is consumed front to back; tell the kernel so it
+            # reads ahead instead of waiting on each 4K page fault
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(raw.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            with zipfile.ZipFile(raw) as archive, archive.open('word/document.xml') as doc_xml:
+                texts = []
+                for _, element in ET.iterparse(doc_xml, events=('end',)):
+                    if element.tag == DOCX_NS + 't':
+                        texts.append(element.text or '')
+                    elif element.tag == DOCX_NS + 'p':
+                        texts.append('\n')
+                    element.clear()
+                return ''.join(texts).strip()
+    except Exception as e:
+        print(f"Warning: Could not read {filepath}: {e}")
+        return None
+
+
+def read_file(filepath):
+    """Read song content from a .doc or .docx file"""
+    lowered = str(filepath).lower()
+    if lowered.endswith('.doc'):
+        return read_doc(filepath)
+    elif lowered.endswith('.docx'):
+        return read_docx(filepath)
+    else:
+        return None
+
+
+def read_chunk(songs):
+    """Read a chunk of song dicts in one worker, batching antiword calls
+
+    Intended as the unit of work for a ProcessPoolExecutor; returns the
+    extracted text (or None) for each song in order.
+    """
+    doc_paths = [s['filepath'] for s in songs if s['filepath'].lower().endswith('.doc')]
+    doc_texts = read_docs_batch(doc_paths) if doc_paths else {}
+    contents = []
+    for song in songs:
+        filepath = song['filepath']
+        if filepath in doc_texts:
+            contents.append(doc_texts[filepath])
+        else:
+            contents.append(read_file(filepath))
+    return contents
@@ -0,0 +1,56 @@
+"""
+Directory scanning for the song import scripts
+"""
+
+import os
+
+
+def _song_entry(path, name, language):
+    return {
+        'filepath': path,
+        'filename': name,
+        # Pre-compute the title so the import loops never rebuild a Path per file
+        'title': os.path.splitext(name)[0],
+        'language': language
+    }
+
+
+def scan_song_dirs(song_dirs):
+    """Scan the per-language song directories and return a list of song dicts
+
+    Single scandir pass per directory; avoids the per-entry stat + Path
+    allocation of glob.
+    """
+    songs = []
+
+    for language, directory in song_dirs.items():
+        if not os.path.isdir(directory):
+            print(f"Warning: Directory not found: {directory}")
+            continue
+
+        count = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(('.doc', '.docx')):
+                    songs.append(_song_entry(entry.path, entry.name, language))
+                    count += 1
+
+        print(f"Found {count} {language} songs")
+
+    return songs
+
+
+def scan_song_tree(base_dir, language_map, default_language='english'):
+    """Recursively scan base_dir, mapping folder names to languages"""
+    songs = []
+
+    for root, _, files in os.walk(base_dir):
+        language = default_language
+        for part in root.split(os.sep):
+            if part in language_map:
+                language = language_map[part]
+        for name in files:
+            if name.lower().endswith(('.doc', '.docx')):
+                songs.append(_song_entry(os.path.join(root, name), name, language))
+
+    return songs
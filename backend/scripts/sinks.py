@@ -0,0 +1,135 @@
+"""
+Insert sinks for the song import scripts
+
+Each sink takes batches of prepared rows and writes them to PostgreSQL;
+the REST path lives in import_songs.py since it is an async pipeline.
+Sinks never commit — callers own transaction boundaries.
+"""
+
+from datetime import datetime
+
+
+def fetch_existing_songs(conn):
+    """Return the set of (title, language) pairs already in the songs table
+
+    Lets re-runs skip extraction entirely for files that are already
+    imported, instead of paying antiword/XML parsing just to have the
+    insert deduplicated away.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT title, language FROM songs")
+    existing = set(cursor.fetchall())
+    cursor.close()
+    return existing
+
+
+# Where drop_song_indexes saves the DDL of the indexes it drops
+INDEX_BACKUP_PATH = 'songs_index_defs.sql'
+
+
+def drop_song_indexes(conn):
+    """Drop secondary indexes on songs and return their definitions for rebuild
+
+    Every insert pays B-tree maintenance per index; for a one-shot bulk
+    load it is much cheaper to drop the non-constraint indexes up front
+    and rebuild them once at the end. The definitions are written to
+    INDEX_BACKUP_PATH before anything is dropped, so if the process dies
+    before the rebuild the indexes can be restored with
+    psql -f songs_index_defs.sql.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = 'public' AND tablename = 'songs'
+          AND indexname NOT IN (
+              SELECT conname FROM pg_constraint WHERE conrelid = 'songs'::regclass
+          )
+    """)
+    indexes = cursor.fetchall()
+    if indexes:
+        with open(INDEX_BACKUP_PATH, 'w', encoding='utf-8') as backup:
+            for _, indexdef in indexes:
+                backup.write(indexdef + ';\n')
+        print(f"Saved index definitions to {INDEX_BACKUP_PATH} "
+              f"(restore with psql -f if the import dies before the rebuild)")
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+    conn.commit()
+    cursor.close()
+    return [indexdef for _, indexdef in indexes]
+
+
+def recreate_song_indexes(conn, index_defs):
+    """Rebuild the indexes dropped before the bulk load"""
+    cursor = conn.cursor()
+    for indexdef in index_defs:
+        cursor.execute(indexdef)
+    conn.commit()
+    cursor.close()
+
+
+class CopySink:
+    """COPY rows straight into songs with client-side ids
+
+    Rows are (id, title, lyrics, language, author, translation) tuples;
+    both timestamps are stamped once per batch.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def insert(self, rows):
+        now = datetime.now()
+        with self.cursor.copy(
+            "COPY songs (id, title, lyrics, language, author, translation, created_at, updated_at) "
+            "FROM STDIN"
+        ) as copy:
+            for song_id, title, lyrics, language, author, translation in rows:
+                copy.write_row((song_id, title, lyrics, language, author, translation, now, now))
+        return len(rows)
+
+    def close(self):
+        self.cursor.close()
+
+
+class CopyTempTableSink:
+    """COPY into a temp table, then INSERT ... ON CONFLICT DO NOTHING
+
+    Rows are (title, artist, lyrics, language, content) tuples; ids come
+    from gen_random_uuid() and timestamps from NOW(), so Python never
+    touches /dev/urandom or the clock per row. Returns the number of rows
+    that survived the conflict check.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+
+    def insert(self, rows):
+        # Stage only the columns the COPY fills: cloning the full songs
+        # definition would drag along NOT NULL constraints on id and the
+        # timestamps, which nothing guarantees have column defaults.
+        # Dropped explicitly (not ON COMMIT) so several batches can share
+        # one transaction when the caller batches commits
+        self.cursor.execute(
+            "CREATE TEMP TABLE songs_import AS "
+            "SELECT title, artist, lyrics, language, content FROM songs WITH NO DATA"
+        )
+        with self.cursor.copy(
+            "COPY songs_import (title, artist, lyrics, language, content) FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+        self.cursor.execute("""
+        INSERT INTO songs (id, title, artist, lyrics, language, content, created_at, updated_at)
+        SELECT gen_random_uuid(), title, artist, lyrics, language, content, NOW(), NOW()
+        FROM songs_import
+        ON CONFLICT DO NOTHING
+        """)
+        inserted = self.cursor.rowcount
+        self.cursor.execute("DROP TABLE songs_import")
+        return inserted
+
+    def close(self):
+        self.cursor.close()